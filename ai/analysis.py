@@ -1,12 +1,25 @@
 # ai/analysis.py
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
 import os
-from typing import Optional, Dict, Any, List
-
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Final, Iterator, Optional, Dict, Any, List, Sequence, Tuple, Union
+
+import httpx
+import numpy as np
+import orjson
 import pandas as pd
-from openai import AzureOpenAI
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+if TYPE_CHECKING:
+    # The openai SDK is slow to import; only load it when a client is actually built.
+    from openai import AsyncAzureOpenAI, AzureOpenAI
 
 # --- Card contract (frontend-friendly) ---
 CARD_ORDER = [
@@ -19,8 +32,16 @@ CARD_ORDER = [
 
 ALLOWED_TONES = {"good", "warn", "bad", "neutral"}
 
+# Longest text cell sent to the model (module / media titles)
+_MAX_CELL_CHARS = 40
+
+# Size cap per table in the prompt, so wide uploads can't blow up the token count
+_TABLE_BUDGET_BYTES = 4000
+
 # Keep your content instructions the same, but add a strict output contract.
-SYSTEM_PROMPT = """You are an academic learning analytics assistant.
+# This must stay byte-identical across calls (no interpolation): Azure caches the shared
+# prompt prefix, so all per-course data belongs in the user message.
+SYSTEM_PROMPT: Final[str] = """You are an academic learning analytics assistant.
 Write a concise, plain-English analysis for instructors teaching online asychronous courses.
 
 Content Rules (keep these exactly):
@@ -31,6 +52,12 @@ Content Rules (keep these exactly):
 - Keep it under ~750 words unless asked for more.
 - Always provide these same sections with these headings: "General Overview", "Echo360 Engagement", "Gradebook Trends", "Notable Trends", and "Further Investigations", in that order.
 
+Additional analysis rules:
+- Identify general trends and data points worthy of further investigation.
+- No need to list each section of the course individually. Call out aspects that seem important.
+- Provide a short summary at the end of each section (put it into the card.summary field).
+- In the "Notable Trends" section, compare overall patterns between Gradebook Module Metrics and Echo Module Metrics.
+
 OUTPUT FORMAT (required):
 Return ONLY valid JSON (no Markdown, no extra text) in this exact shape:
 
@@ -58,21 +85,41 @@ Rules for JSON:
 """
 
 
+# --- Response cache ---
+# Re-running the same uploads produces the same prompt, so reuse the previous answer
+# instead of paying another Azure round-trip. Keyed by a hash of every input that
+# shapes the request; bounded LRU, per process. Set ANALYSIS_CACHE_DIR to also keep
+# answers on disk, shared by every worker and surviving restarts. Disk entries expire
+# after ANALYSIS_CACHE_MAX_AGE seconds (default 7 days) and at most
+# ANALYSIS_CACHE_MAX_FILES (default 1024) are kept; the oldest go first.
+ANALYSIS_CACHE_SIZE = 256
+_analysis_cache: "OrderedDict[str, str]" = OrderedDict()
+_analysis_cache_lock = threading.Lock()
+
+
 def _get_env(name: str, default: Optional[str] = None) -> Optional[str]:
     v = os.getenv(name)
     return v if v not in (None, "") else default
 
 
-def _get_ai_client() -> AzureOpenAI:
+# Cap on concurrent Azure calls from the async path (per process), to smooth out 429s.
+_ai_semaphore = asyncio.Semaphore(int(_get_env("AZURE_OPENAI_MAX_CONCURRENCY", "8")))
+
+
+_DEFAULT_API_VERSION = "2024-02-15-preview"
+
+
+def _client_kwargs() -> Dict[str, Any]:
     """
     Expected environment variables:
       - AZURE_OPENAI_ENDPOINT        e.g. "https://my-openai-resource.openai.azure.com"
       - AZURE_OPENAI_API_KEY         key from the Azure OpenAI resource
       - AZURE_OPENAI_API_VERSION     optional (defaults below)
+      - AZURE_OPENAI_MAX_RETRIES     optional; the SDK retries 429/5xx with exponential backoff
     """
     endpoint = _get_env("AZURE_OPENAI_ENDPOINT")
     api_key = _get_env("AZURE_OPENAI_API_KEY")
-    api_version = _get_env("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+    api_version = _get_env("AZURE_OPENAI_API_VERSION", _DEFAULT_API_VERSION)
 
     if not endpoint or not api_key:
         raise RuntimeError(
@@ -80,111 +127,514 @@ def _get_ai_client() -> AzureOpenAI:
             "Set AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY as environment variables."
         )
 
-    return AzureOpenAI(
-        api_key=api_key,
-        azure_endpoint=endpoint,
-        api_version=api_version,
-    )
+    return {
+        "api_key": api_key,
+        "azure_endpoint": endpoint,
+        "api_version": api_version,
+        "max_retries": int(_get_env("AZURE_OPENAI_MAX_RETRIES", "4")),
+    }
 
 
-def _df_to_markdown(df: Optional[pd.DataFrame], max_rows: int = 30) -> str:
+# Clients are built once per process and reused so the HTTP connection pool (and its
+# TLS sessions) carries over between calls instead of handshaking with Azure every time.
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+
+@lru_cache(maxsize=1)
+def _get_ai_client() -> AzureOpenAI:
+    from openai import AzureOpenAI, DefaultHttpxClient
+
+    return AzureOpenAI(**_client_kwargs(), http_client=DefaultHttpxClient(limits=_HTTP_LIMITS))
+
+
+@lru_cache(maxsize=1)
+def _get_async_ai_client() -> AsyncAzureOpenAI:
+    from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+
+    return AsyncAzureOpenAI(**_client_kwargs(), http_client=DefaultAsyncHttpxClient(limits=_HTTP_LIMITS))
+
+
+def _unsupported_request_errors() -> tuple:
+    """
+    Errors meaning the deployment rejected the request's shape (stream / response_format).
+    Only these move down the fallback ladder; throttling, auth, timeouts and dropped
+    streams have already been retried by the SDK and are re-raised.
+    """
+    from openai import BadRequestError, UnprocessableEntityError
+
+    return (BadRequestError, UnprocessableEntityError)
+
+
+def _stream_completion(client: "AzureOpenAI", **kwargs: Any) -> str:
+    """Run a chat completion with stream=True and join the content deltas as they arrive."""
+    parts: List[str] = []
+    for chunk in client.chat.completions.create(stream=True, **kwargs):
+        # Azure sends a leading chunk with no choices (content-filter results); skip those.
+        if chunk.choices:
+            parts.append(chunk.choices[0].delta.content or "")
+    return "".join(parts)
+
+
+async def _stream_completion_async(client: "AsyncAzureOpenAI", **kwargs: Any) -> str:
+    parts: List[str] = []
+    async for chunk in await client.chat.completions.create(stream=True, **kwargs):
+        if chunk.choices:
+            parts.append(chunk.choices[0].delta.content or "")
+    return "".join(parts)
+
+
+# Request shapes to try, in order, as (stream, response_format). JSON mode is supported on
+# many Azure deployments; some reject streaming it, and older deployments/APIs reject
+# response_format altogether. A step is tried only if the previous one was rejected.
+_COMPLETION_LADDER: Final = (
+    (True, {"type": "json_object"}),
+    (False, {"type": "json_object"}),
+    (True, None),
+)
+
+
+def _ladder_steps(kwargs: Dict[str, Any]) -> Iterator[Tuple[bool, Dict[str, Any]]]:
+    """Yield (stream, request kwargs) for each _COMPLETION_LADDER step."""
+    for stream, response_format in _COMPLETION_LADDER:
+        yield stream, (dict(kwargs, response_format=response_format) if response_format else kwargs)
+
+
+def _complete(client: "AzureOpenAI", **kwargs: Any) -> str:
+    """Chat completion text, walking _COMPLETION_LADDER until a request shape is accepted."""
+    for stream, step in _ladder_steps(kwargs):
+        try:
+            if stream:
+                return _stream_completion(client, **step)
+            resp = client.chat.completions.create(**step)
+            return resp.choices[0].message.content or ""
+        except _unsupported_request_errors() as e:
+            rejected = e
+    # Every shape was rejected; surface the last rejection
+    raise rejected
+
+
+async def _complete_async(client: "AsyncAzureOpenAI", **kwargs: Any) -> str:
+    """Async twin of _complete."""
+    for stream, step in _ladder_steps(kwargs):
+        try:
+            if stream:
+                return await _stream_completion_async(client, **step)
+            resp = await client.chat.completions.create(**step)
+            return resp.choices[0].message.content or ""
+        except _unsupported_request_errors() as e:
+            rejected = e
+    # Every shape was rejected; surface the last rejection
+    raise rejected
+
+
+def _df_to_compact(
+    df: Optional[pd.DataFrame],
+    max_rows: int = 30,
+    drop_constant: bool = True,
+    max_bytes: int = _TABLE_BUDGET_BYTES,
+) -> str:
+    """
+    Render a table for the prompt as pipe-delimited text (header row + data rows).
+    Every character is an input token, so:
+      - no alignment padding
+      - all-empty columns are dropped, and (with drop_constant) columns that hold the
+        same value on every row, since they say nothing per-row
+      - floats are rounded to 3 decimals, text cells clipped to _MAX_CELL_CHARS
+      - output is capped at max_bytes: when a wide table overflows, text columns are
+        kept and numeric columns are added in order of variance while they still fit
+    """
     if df is None or df.empty:
         return "(empty)"
-    df2 = df.copy().head(max_rows)
+    head = df.head(max_rows)
+
+    keep = head.notna().any().to_numpy()
+    if drop_constant and len(head) > 1:
+        keep = keep & (head.nunique(dropna=False) > 1).to_numpy()
+    if not keep.any():
+        return "(empty)"
+    head = head.loc[:, keep]
+
+    # Formatted columns go into a new dict; the caller's frame is never copied or mutated
+    cols: Dict[Any, pd.Series] = {c: head[c] for c in head.columns}
+
+    # Clip long titles
+    for c in head.select_dtypes(include=["object", "string"]).columns:
+        cols[c] = head[c].map(lambda v: v[:_MAX_CELL_CHARS] if isinstance(v, str) else v)
+
+    # Round percentage-like columns if any are numeric fractions (one pass over all float columns)
+    num = head.select_dtypes(include=[np.floating])
+    if not num.empty:
+        frac_like = ((num >= 0) & (num <= 1)).mean() > 0.6
+        frac_cols = frac_like.index[frac_like.to_numpy()]
+        other_cols = frac_like.index[~frac_like.to_numpy()]
+        if len(frac_cols):
+            pct = (num[frac_cols] * 100).round(1).astype(str) + "%"
+            cols.update(pct.items())
+        if len(other_cols):
+            cols.update(num[other_cols].round(3).items())
+
+    out = pd.DataFrame(cols)
+    text = _render_table(out)
+    if len(text.encode("utf-8")) <= max_bytes:
+        return text
+
+    # Over budget: bisect on how many of the most variable numeric columns fit
+    numeric = head.select_dtypes(include="number")
+    ranked = list(numeric.var().sort_values(ascending=False, na_position="last").index)
+    labels = [c for c in out.columns if c not in numeric.columns]
+
+    def _footer(shown: int) -> str:
+        return f"\n(showing {shown} of {len(out.columns)} columns)"
+
+    # Reserve room for the footer at its widest, so table + footer stays within max_bytes
+    table_budget = max_bytes - len(_footer(len(out.columns)).encode("utf-8"))
+
+    def _fit(k: int) -> str:
+        chosen = set(labels).union(ranked[:k])
+        return _render_table(out[[c for c in out.columns if c in chosen]])
+
+    lo, hi = 0, len(ranked)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if len(_fit(mid).encode("utf-8")) <= table_budget:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return _fit(lo) + _footer(len(labels) + lo)
 
-    # Round percentage-like columns if any are numeric fractions
-    for c in df2.columns:
-        if df2[c].dtype.kind in "fc":
-            s = df2[c]
+
+def _render_table(df: pd.DataFrame) -> str:
+    return df.to_csv(index=False, sep="|", lineterminator="\n").rstrip("\n")
+
+
+# Bump when the stored report format (_finalize's output) changes, so entries persisted
+# by an older deploy stop matching.
+_CACHE_FORMAT_VERSION = 2
+
+
+def _analysis_cache_key(payload: str, model: Optional[str], temperature: float) -> str:
+    """
+    Hash of the request actually sent: system prompt, rendered user message, and the
+    deployment that answers it (AZURE_OPENAI_DEPLOYMENT overrides model) with its endpoint
+    and API version. Hashing the rendered prompt rather than the input frames means a
+    change to how tables are rendered misses old entries instead of reusing them.
+    """
+    target = [
+        _CACHE_FORMAT_VERSION,
+        _get_env("AZURE_OPENAI_ENDPOINT"),
+        _get_env("AZURE_OPENAI_DEPLOYMENT", model),
+        _get_env("AZURE_OPENAI_API_VERSION", _DEFAULT_API_VERSION),
+        temperature,
+    ]
+    h = hashlib.blake2b(digest_size=16)
+    h.update(orjson.dumps(target))
+    for part in (SYSTEM_PROMPT, payload):
+        h.update(b"\x1e")
+        h.update(part.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _disk_cache_path(key: str) -> Optional[str]:
+    cache_dir = _get_env("ANALYSIS_CACHE_DIR")
+    return os.path.join(cache_dir, f"{key}.json") if cache_dir else None
+
+
+def _disk_max_age() -> float:
+    return float(_get_env("ANALYSIS_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+
+def _disk_get(key: str) -> Optional[str]:
+    path = _disk_cache_path(key)
+    if path is None:
+        return None
+    try:
+        if time.time() - os.path.getmtime(path) > _disk_max_age():
+            os.remove(path)
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _disk_prune(cache_dir: str) -> None:
+    """Drop expired entries, then the oldest ones beyond ANALYSIS_CACHE_MAX_FILES."""
+    max_files = int(_get_env("ANALYSIS_CACHE_MAX_FILES", "1024"))
+    cutoff = time.time() - _disk_max_age()
+    entries = []
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json") and entry.is_file():
+                    entries.append((entry.stat().st_mtime, entry.path))
+    except OSError:
+        return
+    entries.sort(reverse=True)
+    for i, (mtime, path) in enumerate(entries):
+        if i >= max_files or mtime < cutoff:
             try:
-                frac_like = s.between(0, 1, inclusive="both").mean() > 0.6
-            except Exception:
-                frac_like = False
-            if frac_like:
-                df2[c] = (s * 100).round(1).astype(str) + "%"
+                os.remove(path)
+            except OSError:
+                pass
 
-    return df2.to_markdown(index=False)
+
+def _disk_put(key: str, value: str) -> None:
+    path = _disk_cache_path(key)
+    if path is None:
+        return
+    # Write to a private temp file and rename, so concurrent workers never read a partial file
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(value)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return
+    # Writes follow a multi-second model call, so a directory scan here is cheap by comparison
+    _disk_prune(os.path.dirname(path))
+
+
+def _memory_put(key: str, value: str) -> None:
+    with _analysis_cache_lock:
+        _analysis_cache[key] = value
+        _analysis_cache.move_to_end(key)
+        while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+
+
+def _memory_get(key: str) -> Optional[str]:
+    with _analysis_cache_lock:
+        hit = _analysis_cache.get(key)
+        if hit is not None:
+            _analysis_cache.move_to_end(key)
+        return hit
+
+
+def _cache_get(key: Optional[str]) -> Optional[str]:
+    if key is None:
+        return None
+    hit = _memory_get(key)
+    if hit is None:
+        hit = _disk_get(key)
+        if hit is not None:
+            _memory_put(key, hit)
+    return hit
+
+
+async def _cache_get_async(key: Optional[str]) -> Optional[str]:
+    """_cache_get for the event loop: memory hits stay inline, disk reads go to a thread."""
+    if key is None:
+        return None
+    hit = _memory_get(key)
+    if hit is None and _get_env("ANALYSIS_CACHE_DIR"):
+        hit = await asyncio.to_thread(_disk_get, key)
+        if hit is not None:
+            _memory_put(key, hit)
+    return hit
+
+
+def _cache_put(key: Optional[str], value: str) -> None:
+    if key is None:
+        return
+    _memory_put(key, value)
+    _disk_put(key, value)
+
+
+# The empty skeleton never changes; serialize it once and decode a fresh copy per use.
+_BLANK_TEMPLATE_JSON = orjson.dumps(
+    {
+        "version": "1.0",
+        "cards": [
+            {"id": cid, "title": title, "summary": "", "bullets": [], "metrics": []}
+            for cid, title in CARD_ORDER
+        ],
+    }
+)
 
 
 def _blank_report(note: str) -> Dict[str, Any]:
     """Safe fallback that still matches the contract."""
+    report = orjson.loads(_BLANK_TEMPLATE_JSON)
+    for card in report["cards"]:
+        card["summary"] = note
+    return report
+
+
+# --- Report schema (pydantic, validated in Rust) ---
+# Every field is lenient: bad values fall back to defaults instead of failing the whole
+# report, matching what the frontend can still render.
+_NO_SUMMARY = "No analysis returned for this section."
+
+
+class _Metric(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    label: str
+    value: str
+    tone: str = "neutral"
+
+    @field_validator("label", "value")
+    @classmethod
+    def _strip(cls, v: str) -> str:
+        return v.strip()
+
+    @field_validator("tone", mode="before")
+    @classmethod
+    def _known_tone(cls, v: Any) -> str:
+        return v if isinstance(v, str) and v in ALLOWED_TONES else "neutral"
+
+
+class _Card(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str
+    summary: str = _NO_SUMMARY
+    bullets: List[str] = []
+    metrics: List[_Metric] = []
+
+    @field_validator("summary", mode="before")
+    @classmethod
+    def _summary(cls, v: Any) -> str:
+        return v.strip() if isinstance(v, str) and v.strip() else _NO_SUMMARY
+
+    @field_validator("bullets", mode="before")
+    @classmethod
+    def _bullets(cls, v: Any) -> List[str]:
+        if not isinstance(v, list) or not all(isinstance(x, str) for x in v):
+            return []
+        # Clip bullet count/length defensively
+        return [b.strip() for b in v if b.strip()][:6]
+
+    @field_validator("metrics", mode="before")
+    @classmethod
+    def _metrics(cls, v: Any) -> List[Dict[str, Any]]:
+        if not isinstance(v, list):
+            return []
+        usable = [
+            m for m in v
+            if isinstance(m, dict) and isinstance(m.get("label"), str) and isinstance(m.get("value"), str)
+        ]
+        return usable[:4]
+
+
+class _Report(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    cards: List[_Card]
+
+    @field_validator("cards", mode="before")
+    @classmethod
+    def _cards_with_ids(cls, v: Any) -> Any:
+        # Only cards carrying a string id can be placed; drop the rest
+        if not isinstance(v, list):
+            return v
+        return [c for c in v if isinstance(c, dict) and isinstance(c.get("id"), str)]
+
+
+def _report_to_contract(report: _Report) -> Dict[str, Any]:
+    """Lay validated cards out in CARD_ORDER, filling any the model skipped."""
+    by_id = {c.id: c for c in report.cards}
     cards: List[Dict[str, Any]] = []
     for cid, title in CARD_ORDER:
+        src = by_id.get(cid)
         cards.append(
             {
                 "id": cid,
                 "title": title,
-                "summary": note,
-                "bullets": [],
-                "metrics": [],
+                "summary": src.summary if src else _NO_SUMMARY,
+                "bullets": src.bullets if src else [],
+                "metrics": [m.model_dump() for m in src.metrics] if src else [],
             }
         )
     return {"version": "1.0", "cards": cards}
 
 
-def _normalize_report(obj: Any) -> Dict[str, Any]:
+_CARD_IDS = frozenset(cid for cid, _ in CARD_ORDER)
+
+
+def _checked_contract(report: _Report) -> Tuple[Dict[str, Any], bool]:
+    """Contract for a validated report, and whether the model filled any known card."""
+    return _report_to_contract(report), any(c.id in _CARD_IDS for c in report.cards)
+
+
+def _normalize_report(obj: Any) -> Tuple[Dict[str, Any], bool]:
     """
     Ensure the model output exactly matches the contract:
     - version string
     - 5 cards in correct order with required keys
     - allowed tones only
+
+    Returns (report, usable). usable is False when the report is a blank fallback
+    because the output held no card we could place; callers must not cache those.
     """
     if not isinstance(obj, dict):
-        return _blank_report("AI analysis returned an invalid structure (non-object).")
+        return _blank_report("AI analysis returned an invalid structure (non-object)."), False
 
-    cards = obj.get("cards")
-    if not isinstance(cards, list):
-        return _blank_report("AI analysis returned no 'cards' array.")
+    if not isinstance(obj.get("cards"), list):
+        return _blank_report("AI analysis returned no 'cards' array."), False
 
-    # Index any returned cards by id (if present)
-    by_id: Dict[str, Dict[str, Any]] = {}
-    for c in cards:
-        if isinstance(c, dict) and isinstance(c.get("id"), str):
-            by_id[c["id"]] = c
+    return _checked_contract(_Report.model_validate(obj))
 
-    normalized_cards: List[Dict[str, Any]] = []
-    for cid, title in CARD_ORDER:
-        src = by_id.get(cid, {})
-        summary = src.get("summary")
-        bullets = src.get("bullets")
-        metrics = src.get("metrics")
 
-        if not isinstance(summary, str) or not summary.strip():
-            summary = "No analysis returned for this section."
+def _build_payload(
+    kpis: dict,
+    echo_module_df: Optional[pd.DataFrame],
+    gradebook_module_df: Optional[pd.DataFrame],
+    gradebook_summary_df: Optional[pd.DataFrame],
+) -> str:
+    """Build the compact, de-identified user message."""
+    # Fractions (0..1 floats) read better to the model as percentages
+    kpi_lines = [
+        f"- {k}: {v*100:.1f}%" if isinstance(v, float) and 0 <= v <= 1 else f"- {k}: {v}"
+        for k, v in (kpis or {}).items()
+        if v is not None
+    ]
+
+    return f"""
+Data for analysis (de-identified):
 
-        if not isinstance(bullets, list) or not all(isinstance(x, str) for x in bullets):
-            bullets = []
-        # Clip bullet count/length defensively
-        bullets = [b.strip() for b in bullets if b.strip()][:6]
-
-        if not isinstance(metrics, list):
-            metrics = []
-        clean_metrics: List[Dict[str, str]] = []
-        for m in metrics:
-            if not isinstance(m, dict):
-                continue
-            label = m.get("label")
-            value = m.get("value")
-            tone = m.get("tone", "neutral")
-            if not isinstance(label, str) or not isinstance(value, str):
-                continue
-            if tone not in ALLOWED_TONES:
-                tone = "neutral"
-            clean_metrics.append({"label": label.strip(), "value": value.strip(), "tone": tone})
-            if len(clean_metrics) >= 4:
-                break
-
-        normalized_cards.append(
-            {
-                "id": cid,
-                "title": title,
-                "summary": summary.strip(),
-                "bullets": bullets,
-                "metrics": clean_metrics,
-            }
-        )
+# KPIs
+{os.linesep.join(kpi_lines) if kpi_lines else "(none)"}
+
+# Echo Module Metrics (per-module)
+{_df_to_compact(echo_module_df)}
 
-    return {"version": "1.0", "cards": normalized_cards}
+# Gradebook Summary Rows
+{_df_to_compact(gradebook_summary_df, drop_constant=False)}
+
+# Gradebook Module Metrics (per-module)
+{_df_to_compact(gradebook_module_df)}
+""".strip()
+
+
+def _finalize(raw: str, cache_key: Optional[str]) -> str:
+    """Parse + normalize the model output to guarantee the contract, caching good results."""
+    raw = raw.strip()
+    try:
+        try:
+            # Well-formed output: parse + validate in a single pydantic-core call
+            normalized, usable = _checked_contract(_Report.model_validate_json(raw))
+        except ValidationError:
+            # Valid JSON with the wrong shape (or not JSON at all, which re-raises below)
+            normalized, usable = _normalize_report(orjson.loads(raw))
+    except Exception:
+        # If the model output isn't parseable JSON, return a valid contract with the raw text tucked into the first card.
+        normalized = _blank_report("AI analysis could not be parsed as JSON.")
+        normalized["cards"][0]["bullets"] = [raw[:5000]] if raw else []
+        # Don't pin a failed parse in the cache; the next run gets another chance.
+        return orjson.dumps(normalized).decode("utf-8")
+
+    result = orjson.dumps(normalized).decode("utf-8")
+    # Only real answers are cached; a blank fallback gets another chance next run
+    if usable:
+        _cache_put(cache_key, result)
+    return result
 
 
 def generate_analysis(
@@ -194,81 +644,112 @@ def generate_analysis(
     gradebook_summary_df: Optional[pd.DataFrame],
     model: str = "gpt-4o-mini",
     temperature: float = 0.3,
+    force_refresh: bool = False,
 ) -> str:
     """
     Returns a JSON STRING that matches the cards contract.
     Keep your API shape the same: result.analysis.text remains a string,
     but now it's parseable JSON for the frontend to render as cards.
+
+    Identical inputs are served from an in-process cache; pass force_refresh=True
+    to always call the model (the fresh result replaces the cached one).
     """
-    # Build a compact, de-identified payload
-    kpi_lines = []
-    for k, v in (kpis or {}).items():
-        if v is None:
-            continue
-        if isinstance(v, float) and 0 <= v <= 1:
-            kpi_lines.append(f"- {k}: {v*100:.1f}%")
-        else:
-            kpi_lines.append(f"- {k}: {v}")
+    payload = _build_payload(kpis, echo_module_df, gradebook_module_df, gradebook_summary_df)
+    cache_key = _analysis_cache_key(payload, model, temperature)
+    if not force_refresh:
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
 
-    payload = f"""
-Data for analysis (de-identified):
+    client = _get_ai_client()
 
-# KPIs
-{os.linesep.join(kpi_lines) if kpi_lines else "(none)"}
+    # In Azure OpenAI, "model" here should be your deployment name
+    deployment_name = _get_env("AZURE_OPENAI_DEPLOYMENT", model)
 
-# Echo Module Metrics (per-module)
-{_df_to_markdown(echo_module_df)}
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": payload},
+    ]
 
-# Gradebook Summary Rows
-{_df_to_markdown(gradebook_summary_df)}
+    raw = _complete(client, model=deployment_name, temperature=temperature, messages=messages)
 
-# Gradebook Module Metrics (per-module)
-{_df_to_markdown(gradebook_module_df)}
+    return _finalize(raw, cache_key)
 
-Additional analysis rules:
-- Identify general trends and data points worthy of further investigation.
-- No need to list each section of the course individually. Call out aspects that seem important.
-- Provide a short summary at the end of each section (put it into the card.summary field).
-- In the "Notable Trends" section, compare overall patterns between Gradebook Module Metrics and Echo Module Metrics.
-""".strip()
 
-    client = _get_ai_client()
+async def generate_analysis_async(
+    kpis: dict,
+    echo_module_df: Optional[pd.DataFrame],
+    gradebook_module_df: Optional[pd.DataFrame],
+    gradebook_summary_df: Optional[pd.DataFrame],
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.3,
+    force_refresh: bool = False,
+) -> str:
+    """
+    Async twin of generate_analysis for the FastAPI backend.
 
-    # In Azure OpenAI, "model" here should be your deployment name
+    Uses AsyncAzureOpenAI so the event loop keeps serving other requests while the
+    model generates. In-flight calls per process are capped by AZURE_OPENAI_MAX_CONCURRENCY.
+    """
+    payload = _build_payload(kpis, echo_module_df, gradebook_module_df, gradebook_summary_df)
+    cache_key = _analysis_cache_key(payload, model, temperature)
+    if not force_refresh:
+        cached = await _cache_get_async(cache_key)
+        if cached is not None:
+            return cached
+
+    client = _get_async_ai_client()
     deployment_name = _get_env("AZURE_OPENAI_DEPLOYMENT", model)
 
-    # Try to force JSON mode (supported on many Azure deployments).
-    # If Azure rejects response_format, we fall back gracefully.
-    try:
-        resp = client.chat.completions.create(
-            model=deployment_name,
-            temperature=temperature,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": payload},
-            ],
-        )
-    except Exception:
-        # Fallback call without response_format (older deployments/APIs)
-        resp = client.chat.completions.create(
-            model=deployment_name,
-            temperature=temperature,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": payload},
-            ],
-        )
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": payload},
+    ]
+
+    async with _ai_semaphore:
+        raw = await _complete_async(client, model=deployment_name, temperature=temperature, messages=messages)
+
+    # Finalizing may write the disk cache; keep that off the event loop
+    return await asyncio.to_thread(_finalize, raw, cache_key)
+
+
+@dataclass
+class AnalysisJob:
+    """Inputs for one generate_analysis call, for use with generate_analyses_batch."""
+    kpis: dict
+    echo_module_df: Optional[pd.DataFrame]
+    gradebook_module_df: Optional[pd.DataFrame]
+    gradebook_summary_df: Optional[pd.DataFrame]
+    model: str = "gpt-4o-mini"
+    temperature: float = 0.3
+    force_refresh: bool = False
+
+
+async def run_analysis_job(job: AnalysisJob) -> str:
+    """generate_analysis_async for one AnalysisJob."""
+    return await generate_analysis_async(
+        kpis=job.kpis,
+        echo_module_df=job.echo_module_df,
+        gradebook_module_df=job.gradebook_module_df,
+        gradebook_summary_df=job.gradebook_summary_df,
+        model=job.model,
+        temperature=job.temperature,
+        force_refresh=job.force_refresh,
+    )
 
-    raw = (resp.choices[0].message.content or "").strip()
 
-    # Parse + normalize to guarantee contract
-    try:
-        obj = json.loads(raw)
-        normalized = _normalize_report(obj)
-    except Exception:
-        # If the model output isn't parseable JSON, return a valid contract with the raw text tucked into the first card.
-        normalized = _blank_report("AI analysis could not be parsed as JSON.")
-        normalized["cards"][0]["bullets"] = [raw[:5000]] if raw else []
+async def generate_analyses_batch(
+    jobs: Sequence[AnalysisJob],
+    return_exceptions: bool = False,
+) -> List[Union[str, BaseException]]:
+    """
+    Run several analyses concurrently over the shared client, returning results in job order.
 
-    return json.dumps(normalized, ensure_ascii=False)
+    Azure's `n` parameter gives n completions of ONE prompt, so each job is its own request;
+    they share the pooled connection, the process-wide concurrency cap and the cache.
+    With return_exceptions=True a failed job yields its exception instead of failing the batch.
+    """
+    return await asyncio.gather(
+        *(run_analysis_job(job) for job in jobs),
+        return_exceptions=return_exceptions,
+    )
@@ -3,6 +3,7 @@ from collections.abc import Iterator, Mapping
 from contextlib import contextmanager
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
@@ -117,14 +118,10 @@ def run_echo_tables(file_bytes: bytes, canvas_df: pd.DataFrame, students_total:
 def run_gradebook_tables(file_bytes: bytes, canvas_df: pd.DataFrame):
     return build_gradebook_tables(io.BytesIO(file_bytes), canvas_df)
 
-def sort_by_canvas_order(df: pd.DataFrame, module_col: str, canvas_df: pd.DataFrame) -> pd.DataFrame:
-    """Sort a dataframe by Canvas module order using module_position; tolerate duplicate names."""
-    if (
-        df is None or df.empty or
-        canvas_df is None or canvas_df.empty or
-        module_col not in df.columns
-    ):
-        return df
+def module_order_index(canvas_df: pd.DataFrame) -> dict[str, int]:
+    """Module name -> rank in Canvas module order (first occurrence wins). Build once, reuse per sort."""
+    if canvas_df is None or canvas_df.empty:
+        return {}
 
     # Build ordered list of module names (keep first occurrence only)
     order = (
@@ -134,16 +131,22 @@ def sort_by_canvas_order(df: pd.DataFrame, module_col: str, canvas_df: pd.DataFr
     )
     # Deduplicate module names while preserving order
     categories = pd.unique(order["module"].astype(str))
+    return {name: i for i, name in enumerate(categories)}
+
 
-    if len(categories) == 0:
+def sort_by_canvas_order(df: pd.DataFrame, module_col: str, order_index: dict[str, int]) -> pd.DataFrame:
+    """Sort a dataframe by Canvas module order (see module_order_index); tolerate duplicate names."""
+    if df is None or df.empty or not order_index or module_col not in df.columns:
         return df
 
-    out = df.copy()
-    out[module_col] = out[module_col].astype(str)
-    out[module_col] = pd.Categorical(out[module_col], categories=categories, ordered=True)
-    out = out.sort_values(module_col).reset_index(drop=True)
+    # Position of each row's module in Canvas order; unknown modules go last
+    names = df[module_col].astype(str)
+    order_key = names.map(order_index).fillna(len(order_index)).to_numpy()
+    idx = np.argsort(order_key, kind="stable")
+
+    out = df.iloc[idx].reset_index(drop=True)
     # Return as string for downstream display
-    out[module_col] = out[module_col].astype(str)
+    out[module_col] = names.to_numpy()[idx]
     return out
 
 # --- Table display helper (place at top level, not inside another function) ---
@@ -280,13 +283,14 @@ if st.session_state.get("results"):
     canvas_df = st.session_state["canvas"]
 
     # Order by Canvas module order
+    order_index = module_order_index(canvas_df)
     if hasattr(gb_tables, "module_assignment_metrics_df") and not gb_tables.module_assignment_metrics_df.empty:
         gb_tables.module_assignment_metrics_df = sort_by_canvas_order(
-            gb_tables.module_assignment_metrics_df, "Module", canvas_df
+            gb_tables.module_assignment_metrics_df, "Module", order_index
         )
     if hasattr(echo_tables, "module_table") and not echo_tables.module_table.empty:
         echo_tables.module_table = sort_by_canvas_order(
-            echo_tables.module_table, "Module", canvas_df
+            echo_tables.module_table, "Module", order_index
         )
 
     # KPIs (prefer Canvas student count when available)
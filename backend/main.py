@@ -1,16 +1,24 @@
 # backend/main.py
 from __future__ import annotations
 
-import io
+import asyncio
 import os
 import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Callable, ClassVar, Optional, Dict, Any, List
 
+import numpy as np
+import orjson
 import pandas as pd
+from cachetools import TTLCache
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
 # --- Make sure we can import your existing modules from the repo root ---
 ROOT = Path(__file__).resolve().parents[1]
@@ -18,10 +26,11 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from services.canvas import CanvasService
+from processors.csv_io import read_csv
 from processors.echo_adapter import build_echo_tables
 from processors.grades_adapter import build_gradebook_tables
 from ui.kpis import compute_kpis
-from ai.analysis import generate_analysis
+from ai.analysis import AnalysisJob, generate_analyses_batch, run_analysis_job
 
 
 # ---------- FastAPI app setup ----------
@@ -64,19 +73,64 @@ def get_canvas_config() -> tuple[str, str]:
     return base_url, token
 
 
+# Decimals kept for floats in JSON responses. Fractions (0..1) still give two decimals of
+# percent; anything finer is noise the UI never shows, and costs ~17 digits per cell.
+_JSON_FLOAT_DECIMALS = 4
+
+
+def _quantize(value: Any) -> Any:
+    if isinstance(value, float):
+        return round(value, _JSON_FLOAT_DECIMALS)
+    return value
+
+
+def _column_values(col: pd.Series) -> list[Any]:
+    if col.dtype.kind == "f":
+        col = col.round(_JSON_FLOAT_DECIMALS)
+    return col.tolist()
+
+
+def _records(df: pd.DataFrame) -> list[Dict[str, Any]]:
+    """
+    Row-of-dict view of a DataFrame, built column-wise.
+
+    Series.tolist() unboxes a whole column to Python scalars in C, so zipping columns is
+    much cheaper than to_dict(orient="records"), which boxes cell by cell. Float columns
+    are rounded to _JSON_FLOAT_DECIMALS first.
+    """
+    columns = list(df.columns)
+    values = [_column_values(df.iloc[:, i]) for i in range(len(columns))]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+# NaN -> null; numpy scalars/arrays encoded natively
+_ORJSON_OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+async def json_response(build: Callable[[], Dict[str, Any]]) -> Response:
+    """
+    Run build() and encode its result with orjson in a worker thread, skipping FastAPI's
+    jsonable_encoder walk and keeping the event loop free. Everything is done before the
+    response starts, so a table that fails to convert or encode is a clean 500.
+    """
+    try:
+        body = await asyncio.to_thread(lambda: orjson.dumps(build(), option=_ORJSON_OPTS))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error encoding response: {e}")
+    return Response(content=body, media_type="application/json")
+
+
 def df_to_records(df: Optional[pd.DataFrame]) -> list[Dict[str, Any]]:
     """
     Convert a DataFrame to list-of-dicts safely for JSON responses.
 
     IMPORTANT:
     - Do NOT reset_index() here. Streamlit shows index separately; turning it into a column changes table shape.
-    - Normalize NaN -> None for JSON.
+    - NaN is left as-is; orjson (json_response) encodes it as null.
     """
     if df is None or df.empty:
         return []
-    out = df.copy()
-    out = out.where(pd.notnull(out), None)
-    return out.to_dict(orient="records")
+    return _records(df)
 
 
 def df_to_records_with_index(df: Optional[pd.DataFrame], index_name: str) -> list[Dict[str, Any]]:
@@ -86,68 +140,131 @@ def df_to_records_with_index(df: Optional[pd.DataFrame], index_name: str) -> lis
     """
     if df is None or df.empty:
         return []
-    out = df.copy()
-    out.index.name = index_name
-    out = out.reset_index()
-    out = out.where(pd.notnull(out), None)
-    return out.to_dict(orient="records")
+    return _records(df.rename_axis(index_name).reset_index())
 
 
-def sort_by_canvas_order(df: pd.DataFrame, module_col: str, canvas_df: pd.DataFrame) -> pd.DataFrame:
+@dataclass(slots=True)
+class ModuleOrder:
     """
-    Sort a dataframe by Canvas module order using module_position; tolerate duplicate names.
-    Mirrors the Streamlit helper so module ordering matches Canvas.
+    Canvas module order as two parallel arrays: unique module names (first occurrence wins
+    for duplicates) and their module_position. Build once per request with from_canvas_df
+    and share across every sort_by_canvas_order call.
     """
-    if (
-        df is None
-        or df.empty
-        or canvas_df is None
-        or canvas_df.empty
-        or module_col not in df.columns
-    ):
-        return df
+    names: np.ndarray
+    positions: np.ndarray
+    _lookup: pd.Index = field(init=False, repr=False)
+
+    # Position given to modules Canvas doesn't know, so they sort last
+    UNKNOWN_POSITION: ClassVar[int] = 10**9
+
+    def __post_init__(self) -> None:
+        # pd.Index keeps its hash table, so every lookup after the first is a single C probe
+        self._lookup = pd.Index(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_canvas_df(cls, canvas_df: Optional[pd.DataFrame]) -> "ModuleOrder":
+        if (
+            canvas_df is None
+            or canvas_df.empty
+            or "module" not in canvas_df.columns
+            or "module_position" not in canvas_df.columns
+        ):
+            return cls(np.array([], dtype=object), np.array([], dtype=np.int64))
+
+        mods = (
+            canvas_df[["module", "module_position"]]
+            .dropna(subset=["module", "module_position"])
+            .drop_duplicates(subset=["module"])
+        )
+        return cls(mods["module"].to_numpy(dtype=object), mods["module_position"].to_numpy(dtype=np.int64))
 
-    if "module_name" not in canvas_df.columns or "module_position" not in canvas_df.columns:
-        return df
+    def positions_of(self, modules: pd.Series) -> np.ndarray:
+        """Canvas position for each module name (UNKNOWN_POSITION when not found)."""
+        idx = self._lookup.get_indexer(modules)
+        if not len(self):
+            return np.full(len(idx), self.UNKNOWN_POSITION, dtype=np.int64)
+        return np.where(idx >= 0, self.positions[idx], self.UNKNOWN_POSITION)
 
-    order = (
-        canvas_df[["module_name", "module_position"]]
-        .dropna(subset=["module_name", "module_position"])
-        .drop_duplicates(subset=["module_name"])
-        .set_index("module_name")["module_position"]
-        .to_dict()
-    )
 
-    df2 = df.copy()
-    df2["_module_pos"] = df2[module_col].map(order)
+def sort_by_canvas_order(df: pd.DataFrame, module_col: str, order: ModuleOrder) -> pd.DataFrame:
+    """
+    Sort a dataframe by Canvas module order; tolerate duplicate names.
+    Mirrors the Streamlit helper so module ordering matches Canvas.
+    """
+    if df is None or df.empty or not len(order) or module_col not in df.columns:
+        return df
+
+    # Unknown modules go to the end; a stable argsort keeps their incoming order
+    return df.iloc[np.argsort(order.positions_of(df[module_col]), kind="stable")]
 
-    # Push unknown modules to end
-    df2["_module_pos"] = df2["_module_pos"].fillna(10**9).astype(int)
 
-    df2 = df2.sort_values(["_module_pos", module_col], kind="stable").drop(columns=["_module_pos"])
-    return df2
+# Module order and enrollment change on the scale of minutes, not uploads, so reuse them.
+# Cached values are shared between requests: callers must treat canvas_order_df as read-only.
+_canvas_ctx_cache: TTLCache = TTLCache(maxsize=512, ttl=300)
+_canvas_ctx_lock = threading.Lock()
+# One fetch per course at a time: concurrent misses for the same course wait for the first.
+# Only courses with a fetch in flight have an entry; the fetcher removes it when done.
+_canvas_fetch_locks: Dict[int, threading.Lock] = {}
+_canvas_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="canvas")
 
 
-def get_canvas_context(course_id: int) -> dict:
+@lru_cache(maxsize=1)
+def get_canvas_service() -> CanvasService:
     """
-    Fetch Canvas-derived context: module order dataframe and student count.
-    Reads base URL + token from environment.
+    Process-wide CanvasService. Its httpx.Client keeps connections alive between
+    requests, so repeat Canvas calls skip the TCP/TLS handshake.
     """
     base_url, token = get_canvas_config()
+    return CanvasService(base_url, token)
 
-    svc = CanvasService(base_url, token)
-    try:
-        canvas_order_df = svc.build_order_df(course_id)
-        student_count = svc.get_student_count(course_id)
-    finally:
-        svc.close()
+
+def _fetch_canvas_context(course_id: int) -> dict:
+    svc = get_canvas_service()
+
+    # Separate Canvas endpoints: issue both at once (httpx.Client is thread-safe)
+    order_fut = _canvas_pool.submit(svc.build_order_df, course_id)
+    count_fut = _canvas_pool.submit(svc.get_student_count, course_id)
 
     return {
-        "canvas_order_df": canvas_order_df,
-        "student_count": student_count,
+        "canvas_order_df": order_fut.result(),
+        "student_count": count_fut.result(),
     }
 
 
+def get_canvas_context(course_id: int) -> dict:
+    """
+    Fetch Canvas-derived context: module order dataframe and student count.
+    Reads base URL + token from environment. Cached per course for 5 minutes.
+    """
+    course_id = int(course_id)
+    with _canvas_ctx_lock:
+        ctx = _canvas_ctx_cache.get(course_id)
+        if ctx is not None:
+            return ctx
+        fetch_lock = _canvas_fetch_locks.setdefault(course_id, threading.Lock())
+
+    with fetch_lock:
+        # Whoever held the lock before us may have just filled the cache
+        with _canvas_ctx_lock:
+            ctx = _canvas_ctx_cache.get(course_id)
+        if ctx is None:
+            try:
+                ctx = _fetch_canvas_context(course_id)
+                with _canvas_ctx_lock:
+                    _canvas_ctx_cache[course_id] = ctx
+            finally:
+                # Threads already waiting hold their own reference to the lock; later
+                # arrivals find the cache filled (or, after a failure, start afresh)
+                with _canvas_ctx_lock:
+                    if _canvas_fetch_locks.get(course_id) is fetch_lock:
+                        del _canvas_fetch_locks[course_id]
+
+    return ctx
+
+
 # ---------- Endpoints ----------
 
 @app.get("/health")
@@ -155,43 +272,73 @@ def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
-@app.post("/analyze")
-async def analyze(
-    course_id: int = Form(...),
-    canvas_gradebook_csv: UploadFile = File(...),
-    echo_analytics_csv: UploadFile = File(...),
+@app.post("/cache/invalidate/{course_id}")
+def invalidate_canvas_context(course_id: int) -> Dict[str, Any]:
+    """Drop the cached Canvas context so the next /analyze refetches it."""
+    with _canvas_ctx_lock:
+        removed = _canvas_ctx_cache.pop(course_id, None) is not None
+    return {"course_id": course_id, "invalidated": removed}
+
+
+async def _build_in_thread(raw: Any, builder: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a table builder off the event loop; a failed parse (raw is an exception) propagates as-is."""
+    if isinstance(raw, Exception):
+        raise raw
+    return await asyncio.to_thread(builder, raw, *args, **kwargs)
+
+
+async def _build_course(
+    course_id: int,
+    canvas_gradebook_csv: UploadFile,
+    echo_analytics_csv: UploadFile,
 ) -> Dict[str, Any]:
-    # ---------- 1) Read upload bytes ----------
+    """
+    Everything /analyze does before the AI step: Canvas context, tables, Canvas ordering, KPIs.
+    Raises HTTPException with the failing stage in the detail.
+    """
+    # ---------- 1) Upload handles ----------
+    # Parse straight from the spooled temp files Starlette already wrote the uploads to,
+    # rather than reading them into bytes and wrapping those in BytesIO (two full copies).
     try:
-        canvas_bytes = await canvas_gradebook_csv.read()
-        echo_bytes = await echo_analytics_csv.read()
+        canvas_file = canvas_gradebook_csv.file
+        echo_file = echo_analytics_csv.file
+        canvas_file.seek(0)
+        echo_file.seek(0)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error reading uploaded files: {e}")
 
-    # ---------- 2) Get Canvas context ----------
-    try:
-        ctx = get_canvas_context(course_id)
-        canvas_order_df: pd.DataFrame = ctx["canvas_order_df"]
-        student_count: Optional[int] = ctx["student_count"]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching Canvas context: {e}")
+    # ---------- 2) Get Canvas context while the CSVs parse ----------
+    # Independent stages: overlap the Canvas HTTP round-trips with CSV parsing in worker threads.
+    loop = asyncio.get_running_loop()
+    ctx, echo_raw, gradebook_raw = await asyncio.gather(
+        loop.run_in_executor(None, get_canvas_context, course_id),
+        loop.run_in_executor(None, read_csv, echo_file),
+        loop.run_in_executor(None, read_csv, canvas_file),
+        return_exceptions=True,
+    )
 
-    # ---------- 3) Build tables (same processors as Streamlit) ----------
-    try:
-        echo_tables = build_echo_tables(io.BytesIO(echo_bytes), canvas_order_df, class_total_students=student_count)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error building Echo tables: {e}")
+    if isinstance(ctx, Exception):
+        raise HTTPException(status_code=500, detail=f"Error fetching Canvas context: {ctx}")
+    canvas_order_df: pd.DataFrame = ctx["canvas_order_df"]
+    student_count: Optional[int] = ctx["student_count"]
 
-    try:
-        gradebook_tables = build_gradebook_tables(io.BytesIO(canvas_bytes), canvas_order_df)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error building Gradebook tables: {e}")
+    # ---------- 3) Build tables (same processors as Streamlit), both at once ----------
+    echo_tables, gradebook_tables = await asyncio.gather(
+        _build_in_thread(echo_raw, build_echo_tables, canvas_order_df, class_total_students=student_count),
+        _build_in_thread(gradebook_raw, build_gradebook_tables, canvas_order_df),
+        return_exceptions=True,
+    )
+    if isinstance(echo_tables, Exception):
+        raise HTTPException(status_code=500, detail=f"Error building Echo tables: {echo_tables}")
+    if isinstance(gradebook_tables, Exception):
+        raise HTTPException(status_code=500, detail=f"Error building Gradebook tables: {gradebook_tables}")
 
     # ---------- 4) Ensure module ordering matches Canvas ----------
     try:
-        echo_module_sorted = sort_by_canvas_order(echo_tables.module_table, "Module", canvas_order_df)
+        module_order = ModuleOrder.from_canvas_df(canvas_order_df)
+        echo_module_sorted = sort_by_canvas_order(echo_tables.module_table, "Module", module_order)
         gb_module_sorted = sort_by_canvas_order(
-            gradebook_tables.module_assignment_metrics_df, "Module", canvas_order_df
+            gradebook_tables.module_assignment_metrics_df, "Module", module_order
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error sorting tables by Canvas order: {e}")
@@ -203,34 +350,47 @@ async def analyze(
             gb_tables=gradebook_tables,
             students_from_canvas=student_count,
         )
+        kpis = {k: _quantize(v) for k, v in kpis.items()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error computing KPIs: {e}")
 
-    # ---------- 6) AI summary ----------
-    analysis_text: Optional[str] = None
-    analysis_error: Optional[str] = None
-    try:
-        analysis_text = generate_analysis(
-            kpis=kpis,
-            echo_module_df=echo_module_sorted,
-            gradebook_module_df=gb_module_sorted,
-            gradebook_summary_df=gradebook_tables.gradebook_summary_df,
-        )
+    return {
+        "kpis": kpis,
+        "echo_tables": echo_tables,
+        "gradebook_tables": gradebook_tables,
+        "echo_module_sorted": echo_module_sorted,
+        "gb_module_sorted": gb_module_sorted,
+    }
 
-    except Exception as e:
-        analysis_error = str(e)
 
-    # ---------- 7) Response (Streamlit-parity tables only) ----------
-    response: Dict[str, Any] = {
-        "kpis": kpis,
+def _analysis_job(course: Dict[str, Any], force_refresh: bool) -> AnalysisJob:
+    return AnalysisJob(
+        kpis=course["kpis"],
+        echo_module_df=course["echo_module_sorted"],
+        gradebook_module_df=course["gb_module_sorted"],
+        gradebook_summary_df=course["gradebook_tables"].gradebook_summary_df,
+        force_refresh=force_refresh,
+    )
+
+
+def _course_response(
+    course: Dict[str, Any],
+    analysis_text: Optional[str],
+    analysis_error: Optional[str],
+) -> Dict[str, Any]:
+    """Streamlit-parity tables only."""
+    echo_tables = course["echo_tables"]
+    gradebook_tables = course["gradebook_tables"]
+    return {
+        "kpis": course["kpis"],
         "echo": {
             "summary": df_to_records(echo_tables.echo_summary),
-            "modules": df_to_records(echo_module_sorted),
+            "modules": df_to_records(course["echo_module_sorted"]),
         },
         "grades": {
             # Streamlit shows index labels as row headers; we send them as a named column "Metric"
             "summary": df_to_records_with_index(gradebook_tables.gradebook_summary_df, "Metric"),
-            "module_metrics": df_to_records(gb_module_sorted),
+            "module_metrics": df_to_records(course["gb_module_sorted"]),
         },
         "analysis": {
             "text": analysis_text,
@@ -238,4 +398,104 @@ async def analyze(
         },
     }
 
-    return response
+
+@app.post("/analyze")
+async def analyze(
+    course_id: int = Form(...),
+    canvas_gradebook_csv: UploadFile = File(...),
+    echo_analytics_csv: UploadFile = File(...),
+    force_refresh: bool = Form(False),
+) -> Response:
+    course = await _build_course(course_id, canvas_gradebook_csv, echo_analytics_csv)
+
+    # ---------- 6) AI summary ----------
+    analysis_text: Optional[str] = None
+    analysis_error: Optional[str] = None
+    try:
+        analysis_text = await run_analysis_job(_analysis_job(course, force_refresh))
+
+    except Exception as e:
+        analysis_error = str(e)
+
+    # ---------- 7) Response ----------
+    return await json_response(partial(_course_response, course, analysis_text, analysis_error))
+
+
+@app.post("/analyze_batch")
+async def analyze_batch(
+    course_ids: List[int] = Form(...),
+    canvas_gradebook_csvs: List[UploadFile] = File(...),
+    echo_analytics_csvs: List[UploadFile] = File(...),
+    force_refresh: bool = Form(False),
+) -> Response:
+    """
+    /analyze for several courses in one request. The i-th course_id pairs with the i-th
+    gradebook and Echo upload. Courses are built concurrently and their AI analyses
+    run as one batch; results come back in course_ids order.
+    """
+    if not (len(course_ids) == len(canvas_gradebook_csvs) == len(echo_analytics_csvs)):
+        raise HTTPException(
+            status_code=400,
+            detail="course_ids, canvas_gradebook_csvs and echo_analytics_csvs must have the same length.",
+        )
+
+    courses = await asyncio.gather(
+        *(
+            _build_course(cid, gb, echo)
+            for cid, gb, echo in zip(course_ids, canvas_gradebook_csvs, echo_analytics_csvs)
+        )
+    )
+
+    analyses = await generate_analyses_batch(
+        [_analysis_job(course, force_refresh) for course in courses],
+        return_exceptions=True,
+    )
+
+    def build() -> Dict[str, Any]:
+        results = []
+        for cid, course, analysis in zip(course_ids, courses, analyses):
+            if isinstance(analysis, BaseException):
+                item = _course_response(course, None, str(analysis))
+            else:
+                item = _course_response(course, analysis, None)
+            results.append({"course_id": cid, **item})
+        return {"results": results}
+
+    return await json_response(build)
+
+
+def _default_workers() -> int:
+    """
+    Worker count when WEB_CONCURRENCY isn't set: the CPUs this process may run on, capped
+    at 4. os.cpu_count() reports the whole host inside a container, and every worker
+    holds its own pandas/openai import plus caches, so size up explicitly if memory allows.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        cpus = os.cpu_count() or 1
+    return max(1, min(cpus, 4))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Several workers: each runs its own pandas/KPI pipeline while the others wait on
+    # Canvas/Azure I/O. Workers share nothing in memory (Canvas client, context and analysis
+    # caches are per process); set ANALYSIS_CACHE_DIR to share analyses between them.
+    # Multiple workers need the app as an import string rather than the object.
+    #
+    # limit_concurrency counts open connections, idle keep-alive ones included; past it new
+    # requests get 503. Keep-alive stays at uvicorn's 5s default so idle clients free their
+    # slot quickly; if UVICORN_KEEP_ALIVE is raised, raise UVICORN_LIMIT_CONCURRENCY with it.
+    uvicorn.run(
+        "backend.main:app",
+        app_dir=str(ROOT),
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY") or _default_workers()),
+        loop="uvloop",
+        http="httptools",
+        limit_concurrency=int(os.getenv("UVICORN_LIMIT_CONCURRENCY", "64")),
+        timeout_keep_alive=int(os.getenv("UVICORN_KEEP_ALIVE", "5")),
+    )
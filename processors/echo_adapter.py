@@ -9,6 +9,8 @@ import numpy as np
 import pandas as pd
 from rapidfuzz import process, fuzz
 
+from processors.csv_io import read_csv
+
 
 @dataclass
 class EchoTables:
@@ -142,9 +144,12 @@ def build_echo_tables(
     """
     Build Echo tables.
 
+    echo_csv_file may be a file-like CSV or an already-parsed DataFrame
+    (which is then modified in place).
+
     Fractions are in [0..1]; charts display them as 0..100%.
     """
-    df = pd.read_csv(echo_csv_file)
+    df = echo_csv_file if isinstance(echo_csv_file, pd.DataFrame) else read_csv(echo_csv_file)
 
     media_col = _find_col(df, CANDIDATES["media"], required=True)
     dur_col   = _find_col(df, CANDIDATES["duration"], required=True)
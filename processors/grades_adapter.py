@@ -8,6 +8,8 @@ import numpy as np
 import pandas as pd
 from rapidfuzz import process, fuzz
 
+from processors.csv_io import read_csv
+
 
 @dataclass
 class GradebookTables:
@@ -104,12 +106,18 @@ def build_gradebook_tables(gradebook_csv_file, canvas_order_df: pd.DataFrame) ->
       - Summary rows: Average, Average Excluding Zeros, % Turned In
       - Module-level averages by fuzzy matching Canvas assignments to gradebook columns
 
+    gradebook_csv_file may be a file-like CSV or an already-parsed DataFrame
+    (whose headers are then cleaned in place).
+
     Assumptions:
       - Row 0 is "Points Possible".
       - Rows 1..N are students (we’ll de-identify).
       - Percentages returned as fractions 0..1.
     """
-    gb_raw = pd.read_csv(gradebook_csv_file)
+    if isinstance(gradebook_csv_file, pd.DataFrame):
+        gb_raw = gradebook_csv_file
+    else:
+        gb_raw = read_csv(gradebook_csv_file)
 
     # Clean headers (strip trailing numeric IDs)
     gb_raw.columns = [_clean_assignment_header(c) for c in gb_raw.columns]
@@ -1,8 +1,11 @@
 # services/canvas.py
 from __future__ import annotations
 
-from typing import Optional, List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, List, Dict
+import random
 import re
+import time
 
 import httpx
 import pandas as pd
@@ -19,23 +22,69 @@ class CanvasService:
     Auth: Personal Access Token (Authorization: Bearer <token>)
     """
 
-    def __init__(self, base_url: str, token: str, timeout: float = 30.0) -> None:
+    def __init__(self, base_url: str, token: str, timeout: float = 30.0, max_concurrency: int = 8) -> None:
         self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
         self.client = httpx.Client(
             headers={"Authorization": f"Bearer {token}"},
             timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency * 2, max_keepalive_connections=max_concurrency),
         )
 
     # ---------------- Internal helpers ----------------
 
+    # Canvas throttles bursts of parallel requests; back off and retry this many times,
+    # waiting at most _MAX_RETRY_DELAY per attempt and _THROTTLE_DEADLINE seconds overall
+    _THROTTLE_RETRIES = 5
+    _MAX_RETRY_DELAY = 30.0
+    _THROTTLE_DEADLINE = 60.0
+
+    @staticmethod
+    def _is_throttled(r: httpx.Response) -> bool:
+        if r.status_code == 429:
+            return True
+        # Canvas answers an exhausted request quota with 403 "Rate Limit Exceeded"
+        if r.status_code == 403:
+            remaining = r.headers.get("X-Rate-Limit-Remaining")
+            try:
+                if remaining is not None and float(remaining) <= 0:
+                    return True
+            except ValueError:
+                pass
+            return "rate limit exceeded" in r.text.lower()
+        return False
+
+    @classmethod
+    def _retry_delay(cls, r: httpx.Response, attempt: int) -> float:
+        try:
+            delay = float(r.headers["Retry-After"])
+        except (KeyError, ValueError):
+            # Exponential backoff with jitter so parallel fetches don't retry in lockstep
+            delay = 0.5 * 2 ** attempt + random.uniform(0, 0.25)
+        # Don't trust the header blindly: negative would crash time.sleep, huge would hang /analyze
+        return min(max(delay, 0.0), cls._MAX_RETRY_DELAY)
+
+    def _get(self, url: str, params: Dict | None = None) -> httpx.Response:
+        """GET that waits out Canvas throttling; other HTTP errors raise immediately."""
+        deadline = time.monotonic() + self._THROTTLE_DEADLINE
+        for attempt in range(self._THROTTLE_RETRIES + 1):
+            r = self.client.get(url, params=params)
+            if not self._is_throttled(r) or attempt == self._THROTTLE_RETRIES:
+                break
+            delay = self._retry_delay(r, attempt)
+            if time.monotonic() + delay > deadline:
+                break
+            time.sleep(delay)
+        r.raise_for_status()
+        return r
+
     def _get_all(self, url: str, params: Dict | None = None) -> List[Dict]:
         out: List[Dict] = []
         next_url = url
         next_params = params or {}
 
         while next_url:
-            r = self.client.get(next_url, params=next_params)
-            r.raise_for_status()
+            r = self._get(next_url, params=next_params)
             data = r.json()
             if isinstance(data, list):
                 out.extend(data)
@@ -81,9 +130,28 @@ class CanvasService:
     def get_page_body(self, course_id: int, page_url: str) -> str:
         """Fetch a Canvas page body (HTML)."""
         url = f"{self.base_url}/api/v1/courses/{course_id}/pages/{page_url}"
-        r = self.client.get(url)
-        r.raise_for_status()
-        return r.json().get("body") or ""
+        return self._get(url).json().get("body") or ""
+
+    def get_page_bodies(self, course_id: int, page_urls: Iterable[str]) -> Dict[str, str]:
+        """
+        Fetch several page bodies concurrently (httpx.Client is thread-safe).
+        Pages that fail with an HTTP error (missing, locked) come back as "". Throttling
+        that outlasts the retries raises instead, so embeds never silently go missing.
+        """
+        urls = list(dict.fromkeys(u for u in page_urls if u))
+        if not urls:
+            return {}
+
+        def fetch(page_url: str) -> str:
+            try:
+                return self.get_page_body(course_id, page_url)
+            except httpx.HTTPStatusError as e:
+                if self._is_throttled(e.response):
+                    raise
+                return ""
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(urls))) as pool:
+            return dict(zip(urls, pool.map(fetch, urls)))
 
     @staticmethod
     def _extract_echo_embeds_from_html(html: str) -> List[Dict]:
@@ -126,6 +194,18 @@ class CanvasService:
         """
         modules = self.list_modules_with_items(course_id)
 
+        # Page bodies are the slow part (one request per Page item); fetch them all up front
+        # in parallel instead of one round-trip at a time inside the loop below.
+        page_bodies = self.get_page_bodies(
+            course_id,
+            (
+                it.get("page_url")
+                for m in modules
+                for it in m.get("items", [])
+                if it.get("type") == "Page"
+            ),
+        )
+
         rows: List[Dict] = []
         for m in sorted(modules, key=lambda x: x.get("position", 0)):
             mod_name = m.get("name")
@@ -163,11 +243,7 @@ class CanvasService:
 
                 # ---- Echo videos embedded inside a Page ----
                 if item_type == "Page":
-                    page_url = it.get("page_url")
-                    try:
-                        body = self.get_page_body(course_id, page_url) if page_url else ""
-                    except httpx.HTTPStatusError:
-                        body = ""
+                    body = page_bodies.get(it.get("page_url") or "", "")
                     embeds = self._extract_echo_embeds_from_html(body)
                     if embeds:
                         for e in embeds:
@@ -13,32 +13,34 @@ LETTER_RANK = {g: i for i, g in enumerate(LETTER_ORDER)}
 RANK_TO_LETTER = {i: g for g, i in LETTER_RANK.items()}
 
 
+def letter_ranks(series: Optional[pd.Series]) -> np.ndarray:
+    """
+    Rank (index into LETTER_ORDER) of every recognised letter grade in series.
+    Normalizes once; Categorical codes do the lookup in C instead of a Python map.
+    """
+    if series is None:
+        return np.empty(0, dtype=np.int8)
+    s = series.astype(str).str.strip().str.upper()
+    codes = pd.Categorical(s, categories=LETTER_ORDER).codes
+    return codes[codes >= 0]
+
+
 def median_letter(series: pd.Series) -> str:
     """
     Compute median letter grade using fixed ordering A+..F.
     Unknown values are ignored. Returns "—" if nothing usable.
     """
-    if series is None:
-        return "—"
-    s = series.astype(str).str.strip().str.upper()
-    s = s[s.isin(LETTER_ORDER)]
-    if s.empty:
+    return median_letter_from_ranks(letter_ranks(series))
+
+
+def median_letter_from_ranks(ranks: np.ndarray) -> str:
+    """median_letter for a column already converted with letter_ranks."""
+    if ranks.size == 0:
         return "—"
-    ranks = s.map(LETTER_RANK)
     med_rank = int(np.median(ranks))
     return RANK_TO_LETTER.get(med_rank, "—")
 
 
-def _first_numeric_mean(df: pd.DataFrame, cols: list[str]) -> Optional[float]:
-    """Return mean of the first available numeric column (0..100 expected), else None."""
-    for col in cols:
-        if col in df.columns:
-            vals = pd.to_numeric(df[col], errors="coerce")
-            if vals.notna().any():
-                return float(vals.mean())
-    return None
-
-
 def compute_kpis(
     echo_tables,              # processors.echo_adapter.EchoTables
     gb_tables,                # processors.grades_adapter.GradebookTables
@@ -58,12 +60,16 @@ def compute_kpis(
     else:
         n_students = int(len(gb_tables.gradebook_df.index)) if gb_tables.gradebook_df is not None else 0
 
-    # ---------- Median Letter Grade ----------
-    med_letter = (
-        median_letter(gb_tables.gradebook_df.get("Final Grade"))
-        if gb_tables.gradebook_df is not None and "Final Grade" in gb_tables.gradebook_df.columns
-        else "—"
+    # ---------- Final Grade letters (normalized once for median + F count) ----------
+    has_final_grade = (
+        gb_tables.gradebook_df is not None
+        and not gb_tables.gradebook_df.empty
+        and "Final Grade" in gb_tables.gradebook_df.columns
     )
+    final_ranks = letter_ranks(gb_tables.gradebook_df["Final Grade"]) if has_final_grade else None
+
+    # ---------- Median Letter Grade ----------
+    med_letter = median_letter_from_ranks(final_ranks) if final_ranks is not None else "—"
 
     # ---------- Average Echo360 engagement (percent 0..100) ----------
     avg_echo_pct: Optional[float] = None
@@ -74,15 +80,8 @@ def compute_kpis(
             avg_echo_pct = float(vals.mean() * 100.0)
 
     # ---------- # of Fs ----------
-    num_fs = 0
-    if gb_tables.gradebook_df is not None and not gb_tables.gradebook_df.empty:
-        if "Final Grade" in gb_tables.gradebook_df.columns:
-            num_fs = int((gb_tables.gradebook_df["Final Grade"].astype(str).str.upper() == "F").sum())
-        else:
-            # Fallback: infer via numeric score < 60 if letter column is missing
-            numeric = _first_numeric_mean(gb_tables.gradebook_df, ["Final Score", "Current Score", "Unposted Final Score"])
-            # If we only have the mean, we can't count Fs reliably; leave as 0.
-            num_fs = 0
+    # Without a letter column we can't count Fs reliably; leave as 0.
+    num_fs = int((final_ranks == LETTER_RANK["F"]).sum()) if final_ranks is not None else 0
 
     # ---------- Avg Assignment Grade (class) (fraction 0..1) ----------
     avg_assignment_frac: Optional[float] = None
@@ -1,5 +1,7 @@
 # ui/theme.py
 from __future__ import annotations
+from functools import lru_cache
+
 import streamlit as st
 
 def apply_theme(
@@ -10,6 +12,12 @@ def apply_theme(
     compact_tables: bool = True, # slightly denser tables
 ):
     """Inject CSS for a clean, simple light theme."""
+    st.markdown(_build_css(brand, radius, card_shadow, compact_tables), unsafe_allow_html=True)
+
+
+@lru_cache(maxsize=8)
+def _build_css(brand: str, radius: str, card_shadow: str, compact_tables: bool) -> str:
+    """Theme stylesheet; built once per argument set since apply_theme runs on every rerun."""
     # Fixed light mode palette
     page_bg = "#f3f4f6"          # light gray background
     surface_bg = "#ffffff"       # cards / panels / sidebar
@@ -20,7 +28,7 @@ def apply_theme(
     input_border = "#000000"
     input_focus = "rgba(59,130,246,.28)"  # blue focus ring
 
-    st.markdown(f"""
+    return f"""
     <style>
       @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
 
@@ -260,7 +268,7 @@ def apply_theme(
         margin: 2rem 0;
       }}
     </style>
-    """, unsafe_allow_html=True)
+    """
 
 
 def hero(title: str, subtitle: str | None = None, emoji: str = "📊"):